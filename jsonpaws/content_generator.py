@@ -1,10 +1,14 @@
 import json
 import openai
 
+from .prompt_generator import PromptGenerator
+
+SYSTEM_PROMPT = "You are a helpful assistant designed to output JSON."
+
 class ContentGenerator:
     """Generates content for each field using GPT-4 with modes for analysis, synthesis, and image analysis."""
 
-    def __init__(self, api_key, model='gpt-4o-mini', mode='analysis', max_attempts=1, temperature=None, instructions=None):
+    def __init__(self, api_key, model='gpt-4o-mini', mode='analysis', max_attempts=1, temperature=None, instructions=None, layout='default'):
         """
         Initialize the ContentGenerator with a specific mode and other configurations.
         
@@ -15,9 +19,14 @@ class ContentGenerator:
             max_attempts (int): Number of attempts to generate content.
             temperature (float): Temperature setting for GPT-4's response diversity.
             instructions (str): Additional instructions for the content generation process.
+            layout (str): Message layout. Either 'default' or 'cache_friendly'. The 'cache_friendly'
+                layout sends the system prompt, canonical schema and field guidance first so that
+                provider-side prompt caching can reuse them across calls.
         """
         if mode not in ['analysis', 'synthesis', 'image']:
             raise ValueError("Mode must be either 'analysis', 'synthesis', or 'image'")
+        if layout not in ['default', 'cache_friendly']:
+            raise ValueError("Layout must be either 'default' or 'cache_friendly'")
         
         self.api_key = api_key
         openai.api_key = self.api_key
@@ -26,6 +35,11 @@ class ContentGenerator:
         self.mode = mode
         self.max_attempts = max_attempts
         self.instructions = instructions
+        self.layout = layout
+        self.prompt_generator = PromptGenerator(mode=mode)
+
+        # Token usage accumulated across calls, used to check the prompt cache hit rate
+        self.usage = {'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
         
         # Set default temperatures for each mode if not explicitly provided
         self.temperature = temperature if temperature is not None else (0.5 if mode == 'analysis' else 0.7)
@@ -45,21 +59,28 @@ class ContentGenerator:
         for attempt in range(self.max_attempts):
             try:
                 if self.mode in ['analysis', 'synthesis']:
-                    # Construct prompt for analysis or synthesis
-                    prompt = f"{instructions}\n\nSchema: {json.dumps(json_schema)}"
-                    
-                    # Debug print to show the prompt
+                    if self.layout == 'cache_friendly':
+                        # Static prefix first, per-document content last
+                        messages = [
+                            {"role": "system", "content": self.build_static_prefix(json_schema)},
+                            {"role": "user", "content": instructions}
+                        ]
+                    else:
+                        # Construct prompt for analysis or synthesis
+                        prompt = f"{instructions}\n\nSchema: {json.dumps(json_schema)}"
+                        messages = [
+                            {"role": "system", "content": SYSTEM_PROMPT},
+                            {"role": "user", "content": prompt}
+                        ]
 
                     # Send prompt to GPT-4 for analysis or synthesis
                     response = openai.chat.completions.create(
                         model=self.model,
                         response_format={ "type": "json_object" },
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
-                            {"role": "user", "content": prompt}
-                        ],
+                        messages=messages,
                         temperature=self.temperature
                     )
+                    self.record_usage(response)
                     
                     # Extract content
                     content = response.choices[0].message.content.strip()
@@ -68,30 +89,35 @@ class ContentGenerator:
                     return json.loads(content)
 
                 elif self.mode == 'image':
-                    # Construct prompt for image analysis
-                    image_prompt = f"{instructions}\n\nSchema: {json.dumps(json_schema)}"
-
-                    # Send image and prompt to GPT-4 for image analysis
-                    response = openai.chat.completions.create(
-                        model=self.model,
-                        response_format={ "type": "json_object" },
-                        messages=[
-    {
-      "role": "user",
-      "content": [
-        {"type": "text", "text": f"{image_prompt}"},
-        {
+                    image_content = {
                         "type": "image_url",
                         "image_url": {
                             "url": image_url,
                             "detail": "high"
                         },
-                    },
-      ],
-    }
-  ],
+                    }
+
+                    if self.layout == 'cache_friendly':
+                        # Static prefix first, then the instructions and the image
+                        messages = [
+                            {"role": "system", "content": self.build_static_prefix(json_schema)},
+                            {"role": "user", "content": [{"type": "text", "text": f"{instructions}"}, image_content]}
+                        ]
+                    else:
+                        # Construct prompt for image analysis
+                        image_prompt = f"{instructions}\n\nSchema: {json.dumps(json_schema)}"
+                        messages = [
+                            {"role": "user", "content": [{"type": "text", "text": f"{image_prompt}"}, image_content]}
+                        ]
+
+                    # Send image and prompt to GPT-4 for image analysis
+                    response = openai.chat.completions.create(
+                        model=self.model,
+                        response_format={ "type": "json_object" },
+                        messages=messages,
                         temperature=self.temperature
                     )
+                    self.record_usage(response)
 
                     content = response.choices[0].message.content.strip()
 
@@ -106,6 +132,90 @@ class ContentGenerator:
 
         return None
 
+    def build_static_prefix(self, json_schema):
+        """
+        Build the static part of the prompt for the 'cache_friendly' layout.
+
+        The schema is serialized with sorted keys and fixed separators so the prefix is
+        byte-identical across calls, which lets the provider reuse its prompt cache.
+
+        Args:
+            json_schema (dict): The JSON schema being used for generation or analysis.
+
+        Returns:
+            str: System prompt, canonical schema and per-field guidance.
+        """
+        canonical_schema = json.dumps(json_schema, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        guidance = self.build_field_guidance((json_schema or {}).get('properties', {}))
+
+        prefix = f"{SYSTEM_PROMPT}\n\nSchema: {canonical_schema}"
+        if guidance:
+            prefix += "\n\nField guidance:\n" + "\n".join(guidance)
+
+        return prefix
+
+    def build_field_guidance(self, properties, parent=None):
+        """
+        Build guidance lines for every field, walking nested objects and array items in sorted order.
+
+        Nested fields are named by their path, e.g. 'patients[].age'. Fields whose guidance
+        cannot be generated are left out rather than failing the request.
+
+        Args:
+            properties (dict): Schema properties to describe.
+            parent (str): Path of the enclosing field, if any.
+
+        Returns:
+            list: Guidance lines, one per field.
+        """
+        guidance = []
+        if not isinstance(properties, dict):
+            return guidance
+
+        for field_name in sorted(properties):
+            field_info = properties[field_name]
+            if not isinstance(field_info, dict):
+                continue
+            path = f"{parent}.{field_name}" if parent else field_name
+
+            # Enum values may be numbers, booleans or null; the prompt generator expects strings
+            if field_info.get('enum'):
+                field_info = dict(field_info)
+                field_info['enum'] = [
+                    value if isinstance(value, str) else json.dumps(value)
+                    for value in field_info['enum']
+                ]
+
+            try:
+                guidance.append(f"- {self.prompt_generator.generate_prompt(path, field_info)}")
+            except (AttributeError, TypeError, ValueError):
+                pass
+
+            guidance.extend(self.build_field_guidance(field_info.get('properties'), path))
+            items = field_info.get('items')
+            if isinstance(items, dict):
+                guidance.extend(self.build_field_guidance(items.get('properties'), f"{path}[]"))
+
+        return guidance
+
+    def record_usage(self, response):
+        """
+        Accumulate token usage from a response, including prompt tokens served from the cache.
+
+        Args:
+            response (object): Chat completion response returned by the OpenAI client.
+        """
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return
+
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = (getattr(details, 'cached_tokens', None) if details is not None else None) or 0
+
+        self.usage['prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+        self.usage['completion_tokens'] += getattr(usage, 'completion_tokens', 0) or 0
+        self.usage['cached_tokens'] += cached_tokens
+
     def extract_json_value(self, content, field_name, expected_type, field_info):
     
         try: